@@ -1,9 +1,13 @@
 # stylo.py — clean rebuild
-import os, io, math, asyncio, random, sqlite3, re
+import os, io, asyncio, random, sqlite3, re, queue, atexit, logging, logging.handlers
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 
 import aiohttp
-from PIL import Image, ImageOps, ImageDraw
+from PIL import Image, ImageOps
 
 import discord
 from discord import app_commands
@@ -23,6 +27,21 @@ ROUND_CHAT_CHANNEL_ID = int(os.getenv("STYLO_CHAT_CHANNEL_ID", "0"))  # optional
 ROUND_CHAT_THREAD_NAME = "stylo-round-chat"
 STYLO_CHAT_BUMP_LIMIT = 10
 stylo_chat_counters: dict[int, int] = {}
+TICKET_CHANNELS: dict[int, int] = {}  # channel_id -> entrant_id
+
+# ------------- Logging -------------
+# records are enqueued on the event loop and written by a listener thread
+_LOG_QUEUE: queue.SimpleQueue = queue.SimpleQueue()
+_log_stream = logging.StreamHandler()
+_log_stream.setFormatter(logging.Formatter("[%(name)s] %(message)s"))
+_log_listener = logging.handlers.QueueListener(_LOG_QUEUE, _log_stream)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+log = logging.getLogger("stylo")
+log.setLevel(logging.INFO)
+log.addHandler(logging.handlers.QueueHandler(_LOG_QUEUE))
+log.propagate = False
 
 # ------------- Discord client -------------
 INTENTS = discord.Intents.default()
@@ -30,22 +49,128 @@ INTENTS.message_content = True
 INTENTS.members = True
 INTENTS.guilds = True
 
-bot = commands.Bot(command_prefix="!", intents=INTENTS)
+class StyloBot(commands.Bot):
+    # one keep-alive pool for every CDN fetch; opened in setup_hook
+    http_session: aiohttp.ClientSession | None = None
+
+    def get_http(self) -> aiohttp.ClientSession:
+        """The shared session, (re)opened on first use or if something closed it."""
+        if self.http_session is None or self.http_session.closed:
+            self.http_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=32, limit_per_host=8, ttl_dns_cache=300, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=15, connect=5),
+            )
+        return self.http_session
+
+    async def close(self):
+        if self.http_session and not self.http_session.closed:
+            await self.http_session.close()
+        await super().close()
+
+bot = StyloBot(command_prefix="!", intents=INTENTS)
 INSTANCE = os.getenv("RAILWAY_PUBLIC_DOMAIN") or os.getenv("RAILWAY_PROJECT_ID") or "local"
-print("[stylo] instance:", INSTANCE)
+log.info("instance: %s", INSTANCE)
 
 # ------------- DB helpers -------------
-def db():
-    con = sqlite3.connect(DB_PATH, timeout=10, isolation_level=None)
-    con.row_factory = sqlite3.Row
-    con.execute("PRAGMA journal_mode=WAL;")
-    return con
+# hot statements live here so every call hits the connection's statement cache
+_SQL_MATCH_INSERT = "INSERT INTO match(guild_id,round_index,left_id,right_id,end_utc) VALUES(?,?,?,?,?)"
+_SQL_MATCH_SET_MSG = "UPDATE match SET msg_id=? WHERE id=?"
+_SQL_BUMP_PANEL_ADD = "INSERT OR IGNORE INTO bump_panel(guild_id, match_id, msg_id) VALUES(?,?,?)"
+# undecided matches of a round, with both entrants' name / user / image alongside
+_SQL_ROUND_OPEN_MATCHES = (
+    "SELECT m.id, m.left_id, m.right_id, m.left_votes, m.right_votes, "
+    "el.name AS lname, el.user_id AS l_uid, el.image_url AS l_img, "
+    "er.name AS rname, er.user_id AS r_uid, er.image_url AS r_img "
+    "FROM match m "
+    "LEFT JOIN entrant el ON el.id = m.left_id "
+    "LEFT JOIN entrant er ON er.id = m.right_id "
+    "WHERE m.guild_id=? AND m.round_index=? AND m.winner_id IS NULL"
+)
+# after tie-breaks: the round now ends when its last undecided match does
+_SQL_EVENT_EXTEND_ROUND = "UPDATE event SET state='voting', entry_end_utc=? WHERE guild_id=?"
+_SQL_MATCH_TIE_RESET = "UPDATE match SET left_votes=0,right_votes=0,end_utc=?,winner_id=NULL WHERE id=?"
+_SQL_MATCH_SET_WINNER = "UPDATE match SET winner_id=?, end_utc=? WHERE id=?"
+_SQL_VOTER_CLEAR = "DELETE FROM voter WHERE match_id=?"
+_SQL_MATCH_TOTALS = "SELECT left_votes, right_votes FROM match WHERE id=?"
+_SQL_ROUND_OPEN_MAX_END = (
+    "SELECT MAX(end_utc) AS mx FROM match WHERE guild_id=? AND round_index=? AND winner_id IS NULL"
+)
+_SQL_EVENTS_DUE = (
+    "SELECT * FROM event WHERE state='entry' AND entry_end_utc <= ? "
+    "UNION ALL SELECT * FROM event WHERE state='voting'"
+)
+_SQL_EVENT_CLOSE = "UPDATE event SET state='closed' WHERE guild_id=?"
+_SQL_ENTRANT_UPSERT = (
+    "INSERT INTO entrant(guild_id,user_id,name,caption) VALUES(?,?,?,?) "
+    "ON CONFLICT(guild_id,user_id) DO UPDATE SET name=excluded.name, caption=excluded.caption "
+    "RETURNING id"
+)
+_SQL_EVENT_ACTIVE = (
+    "SELECT guild_id, theme, state, entry_end_utc, round_index, main_channel_id, round_thread_id "
+    "FROM event WHERE guild_id=? AND state IN ('entry','voting')"
+)
+_SQL_TICKET_PUT = "INSERT OR REPLACE INTO ticket(entrant_id, channel_id) VALUES(?,?)"
+_SQL_ENTRANT_SET_IMAGE = "UPDATE entrant SET image_url=? WHERE id=?"
+_SQL_BUMP_PANEL_BY_GUILD = "SELECT msg_id FROM bump_panel WHERE guild_id=?"
+_SQL_BUMP_PANEL_HAS = "SELECT 1 FROM bump_panel WHERE guild_id=? AND match_id=? LIMIT 1"
+_SQL_BUMP_PANEL_DROP = "DELETE FROM bump_panel WHERE guild_id=? AND match_id=?"
+_SQL_VOTE_INSERT = "INSERT OR IGNORE INTO voter(match_id,user_id,side) VALUES(?,?,?)"
+_SQL_VOTE_INCR = (
+    "UPDATE match SET left_votes=left_votes+?, right_votes=right_votes+? WHERE id=? "
+    "RETURNING left_votes, right_votes, end_utc"
+)
+
+_CON: sqlite3.Connection | None = None
+
+def db() -> sqlite3.Connection:
+    """Process-wide connection, opened once with the PRAGMAs applied. Never close it."""
+    global _CON
+    if _CON is None:
+        _CON = sqlite3.connect(DB_PATH, timeout=10, isolation_level=None, cached_statements=256)
+        _CON.row_factory = sqlite3.Row
+        _CON.executescript("""
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA mmap_size=268435456;
+        PRAGMA cache_size=-65536;
+        """)
+    return _CON
+
+@contextmanager
+def transaction(con: sqlite3.Connection):
+    """
+    BEGIN IMMEDIATE ... COMMIT on the shared connection.
+    The body must not await: every coroutine writes through this same connection.
+    """
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        yield con.cursor()
+    except BaseException:
+        con.execute("ROLLBACK")
+        raise
+    con.execute("COMMIT")
+
+# on_message reads the guild's live event on every message; the row only changes on
+# state/round transitions, each of which calls forget_event()
+EVENT_CACHE_TTL = 5.0
+_event_cache: dict[int, tuple[float, sqlite3.Row | None]] = {}
+
+def get_active_event(guild_id: int) -> sqlite3.Row | None:
+    now = asyncio.get_running_loop().time()
+    hit = _event_cache.get(guild_id)
+    if hit and now - hit[0] < EVENT_CACHE_TTL:
+        return hit[1]
+    row = db().execute(_SQL_EVENT_ACTIVE, (guild_id,)).fetchone()
+    _event_cache[guild_id] = (now, row)
+    return row
+
+def forget_event(guild_id: int):
+    _event_cache.pop(guild_id, None)
 
 def init_db():
     con = db(); cur = con.cursor()
     cur.executescript("""
-    PRAGMA journal_mode=WAL;
-
     CREATE TABLE IF NOT EXISTS event (
       guild_id INTEGER PRIMARY KEY,
       theme TEXT NOT NULL,
@@ -106,8 +231,24 @@ def init_db():
       msg_id INTEGER NOT NULL,
       PRIMARY KEY (guild_id, msg_id)
     );
+
+    -- matches still waiting to be posted (post_round_matches)
+    CREATE INDEX IF NOT EXISTS idx_match_round_pending
+      ON match(guild_id, round_index) WHERE msg_id IS NULL;
+    -- per-round match scans (bump panels, round advance) and the undecided
+    -- matches of a round + their MAX(end_utc) (scheduler tick)
+    CREATE INDEX IF NOT EXISTS idx_match_guild_round_winner
+      ON match(guild_id, round_index, winner_id, end_utc);
+    -- a guild's entrants with an uploaded look (round 1 pairing, odd-entrant detection)
+    CREATE INDEX IF NOT EXISTS idx_entrant_guild_img
+      ON entrant(guild_id) WHERE image_url IS NOT NULL AND TRIM(image_url)<>'';
+    -- "is this a ticket channel?" on every upload
+    CREATE INDEX IF NOT EXISTS idx_ticket_channel ON ticket(channel_id);
+    -- scheduler sweeps by state across guilds (guild_id is the rowid, so it rides along)
+    CREATE INDEX IF NOT EXISTS idx_event_state ON event(state);
+
+    ANALYZE;
     """)
-    con.commit(); con.close()
 init_db()
 
 # ------------- Utils -------------
@@ -122,22 +263,35 @@ def humanize_seconds(sec: int) -> str:
     m = round(sec / 60)
     return f"{m//60}h" if m % 60 == 0 else f"{m}m"
 
+_DUR_RE = re.compile(r"^([0-9]*\.?[0-9]+)([mh])?$")
+
 def parse_duration_to_seconds(text: str, default_unit="h") -> int:
     s = (text or "").strip().lower().replace(" ", "")
-    m = re.match(r"^([0-9]*\.?[0-9]+)([mh])?$", s)
+    m = _DUR_RE.match(s)
     if not m: raise ValueError("invalid duration")
     val = float(m.group(1)); unit = m.group(2) or default_unit
     minutes = val * (60 if unit == "h" else 1)
     return max(60, min(int(round(minutes * 60)), 60 * 60 * 24 * 10))  # 1m..10d
 
+def event_vote_seconds(ev) -> int:
+    # vote_seconds is newer; older event rows only carry whole hours
+    return ev["vote_seconds"] if ev["vote_seconds"] else int(ev["vote_hours"]) * 3600
+
 def is_admin(member: discord.Member) -> bool:
     return member.guild_permissions.manage_guild or member.guild_permissions.administrator
 
+# guild_id -> ticket category id (None when unset); only set_ticket_category_id writes it
+_ticket_category: dict[int, int | None] = {}
+
 def get_ticket_category_id(guild_id: int) -> int | None:
+    if guild_id in _ticket_category:
+        return _ticket_category[guild_id]
     con = db(); cur = con.cursor()
     cur.execute("SELECT ticket_category_id FROM guild_settings WHERE guild_id=?", (guild_id,))
-    row = cur.fetchone(); con.close()
-    return row["ticket_category_id"] if row and row["ticket_category_id"] else None
+    row = cur.fetchone()
+    cat_id = row["ticket_category_id"] if row and row["ticket_category_id"] else None
+    _ticket_category[guild_id] = cat_id
+    return cat_id
 
 def set_ticket_category_id(guild_id: int, category_id: int | None):
     con = db(); cur = con.cursor()
@@ -149,7 +303,36 @@ def set_ticket_category_id(guild_id: int, category_id: int | None):
             "ON CONFLICT(guild_id) DO UPDATE SET ticket_category_id=excluded.ticket_category_id",
             (guild_id, category_id)
         )
-    con.commit(); con.close()
+    _ticket_category[guild_id] = category_id
+
+# ------------- Send admission -------------
+# at most this many outbound Discord sends in flight at once. 429s never reach here:
+# discord.py waits out rate limits and retries inside the request itself
+send_admission = asyncio.Semaphore(4)
+
+class SendPacer:
+    """
+    Per-channel sliding window: sends go straight through until `limit` of them
+    land inside `window` seconds, then wait only as long as the oldest needs to age out.
+    """
+    def __init__(self, limit: int = 5, window: float = 5.0):
+        self.limit = limit
+        self.window = window
+        self.sent: dict[int, deque[float]] = {}
+
+    async def wait(self, channel_id: int):
+        q = self.sent.setdefault(channel_id, deque())
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            while q and now - q[0] >= self.window:
+                q.popleft()
+            if len(q) < self.limit:
+                q.append(now)
+                return
+            await asyncio.sleep(self.window - (now - q[0]))
+
+send_pacer = SendPacer()
 
 # ------------- Event-wide chat -------------
 async def ensure_event_chat_thread(guild: discord.Guild, ch: discord.TextChannel, ev_row: sqlite3.Row) -> int | None:
@@ -173,7 +356,7 @@ async def ensure_event_chat_thread(guild: discord.Guild, ch: discord.TextChannel
 
     con = db(); cur = con.cursor()
     cur.execute("UPDATE event SET round_thread_id=? WHERE guild_id=?", (th.id, ev_row["guild_id"]))
-    con.commit(); con.close()
+    forget_event(ev_row["guild_id"])
     await th.send("Chat here about the theme. Voting posts stay clean.")
     return th.id
 
@@ -192,24 +375,20 @@ async def post_chat_floating_panel(guild: discord.Guild, ch: discord.TextChannel
     v.add_item(discord.ui.Button(style=discord.ButtonStyle.link, url=url, label="Chat here"))
     msg = await ch.send(embed=em, view=v)
     con = db(); cur = con.cursor()
-    cur.execute("INSERT OR IGNORE INTO bump_panel(guild_id, match_id, msg_id) VALUES(?,?,?)",
+    cur.execute(_SQL_BUMP_PANEL_ADD,
                 (ev_row["guild_id"], 0, msg.id))
-    con.commit(); con.close()
 
 async def cleanup_bump_panels(guild: discord.Guild, ch: discord.TextChannel | None):
     con = db(); cur = con.cursor()
-    cur.execute("SELECT msg_id FROM bump_panel WHERE guild_id=?", (guild.id,))
+    cur.execute(_SQL_BUMP_PANEL_BY_GUILD, (guild.id,))
     rows = cur.fetchall()
     if ch:
         for r in rows:
             try:
-                m = await ch.fetch_message(r["msg_id"])
-                await m.delete()
-                await asyncio.sleep(0.1)
+                await ch.get_partial_message(r["msg_id"]).delete()
             except:
                 pass
     cur.execute("DELETE FROM bump_panel WHERE guild_id=?", (guild.id,))
-    con.commit(); con.close()
 
 async def cleanup_tickets_for_guild(guild: discord.Guild):
     """Delete all Stylo ticket channels for this guild and clear the DB rows."""
@@ -222,34 +401,36 @@ async def cleanup_tickets_for_guild(guild: discord.Guild):
         "WHERE entrant.guild_id=?",
         (guild.id,)
     )
-    rows = cur.fetchall()
-    for r in rows:
-        ch = guild.get_channel(r["channel_id"])
+    channel_ids = [r["channel_id"] for r in cur.fetchall()]
+    sem = asyncio.Semaphore(5)
+    async def _del(cid: int):
+        TICKET_CHANNELS.pop(cid, None)
+        ch = guild.get_channel(cid)
         if ch:
-            try:
-                await ch.delete(reason="Stylo ticket cleanup")
-                await asyncio.sleep(0.2)
-            except Exception:
-                pass
+            async with sem:
+                try:
+                    await ch.delete(reason="Stylo ticket cleanup")
+                except Exception:
+                    pass
+    await asyncio.gather(*(_del(cid) for cid in channel_ids))
+    with transaction(con) as tx:
+        tx.executemany("DELETE FROM ticket WHERE channel_id=?", [(cid,) for cid in channel_ids])
+
+def load_ticket_channels():
+    """Rebuild the in-memory ticket channel map from the DB (startup)."""
+    cur = db().cursor()
     cur.execute(
-        "DELETE FROM ticket WHERE entrant_id IN (SELECT id FROM entrant WHERE guild_id=?)",
-        (guild.id,)
+        "SELECT ticket.channel_id, ticket.entrant_id FROM ticket "
+        "JOIN entrant ON entrant.id = ticket.entrant_id"
     )
-    con.commit(); con.close()
+    TICKET_CHANNELS.clear()
+    TICKET_CHANNELS.update((r["channel_id"], r["entrant_id"]) for r in cur.fetchall())
 
 # ------------- Join modal & persistent view -------------
 async def create_or_get_entrant(guild_id: int, user: discord.Member, name: str, caption: str | None) -> int:
-    con = db(); cur = con.cursor()
-    cur.execute("SELECT id FROM entrant WHERE guild_id=? AND user_id=?", (guild_id, user.id))
-    row = cur.fetchone()
-    if row:
-        cur.execute("UPDATE entrant SET name=?, caption=? WHERE id=?", (name, caption, row["id"]))
-        con.commit(); con.close(); return row["id"]
-    cur.execute("INSERT INTO entrant(guild_id,user_id,name,caption) VALUES(?,?,?,?)",
-                (guild_id, user.id, name, caption))
-    con.commit()
-    cur.execute("SELECT last_insert_rowid() AS id"); eid = cur.fetchone()["id"]
-    con.close(); return eid
+    with transaction(db()) as cur:
+        cur.execute(_SQL_ENTRANT_UPSERT, (guild_id, user.id, name, caption))
+        return cur.fetchone()["id"]
 
 async def create_ticket_channel(origin_inter: discord.Interaction, entrant_id: int, display_name: str) -> int | None:
     guild = origin_inter.guild
@@ -264,8 +445,11 @@ async def create_ticket_channel(origin_inter: discord.Interaction, entrant_id: i
     name = f"stylo-{display_name.lower().strip().replace(' ', '-')}-{entrant_id}"
     ch = await guild.create_text_channel(name=name[:95], category=category, overwrites=overwrites, reason="Stylo ticket")
     con = db(); cur = con.cursor()
-    cur.execute("INSERT OR REPLACE INTO ticket(entrant_id, channel_id) VALUES(?,?)", (entrant_id, ch.id))
-    con.commit(); con.close()
+    cur.execute(_SQL_TICKET_PUT, (entrant_id, ch.id))
+    # a re-join replaces the entrant's ticket row; the map mirrors the table, so the old channel stops counting
+    for cid in [cid for cid, eid in TICKET_CHANNELS.items() if eid == entrant_id]:
+        del TICKET_CHANNELS[cid]
+    TICKET_CHANNELS[ch.id] = entrant_id
     # pin an instruction
     msg = await ch.send(f"📌 <@{origin_inter.user.id}> upload your **square** image here. I’ll use the latest upload.")
     try: await msg.pin()
@@ -298,7 +482,14 @@ class EntrantModal(discord.ui.Modal, title="Join Stylo"):
                 return
         await inter.followup.send("Couldn’t create your ticket. Check bot perms on the ticket category.", ephemeral=True)
 
+# one shared instance per state; the custom_id is fixed, so every Join panel can use it.
+# built on first use because a View needs the running loop
+_JOIN_VIEWS: dict[bool, discord.ui.View] = {}
+
 def build_join_view(enabled: bool = True) -> discord.ui.View:
+    cached = _JOIN_VIEWS.get(enabled)
+    if cached is not None:
+        return cached
     view = discord.ui.View(timeout=None)
     btn = discord.ui.Button(style=discord.ButtonStyle.success, label="Join",
                             custom_id="stylo:join", disabled=not enabled)
@@ -314,72 +505,186 @@ def build_join_view(enabled: bool = True) -> discord.ui.View:
             except: pass
     btn.callback = join_cb
     view.add_item(btn)
+    _JOIN_VIEWS[enabled] = view
     return view
 
+def build_start_embed(theme: str, entries_value: str, vote_sec: int) -> discord.Embed:
+    """The pinned /stylo start panel; rebuilt from the event row when entries close."""
+    em = discord.Embed(title=f"✨ Stylo: {theme}" if theme else "✨ Stylo",
+                       description="Entries are now **open**!\nTap **Join** to submit your entry. Upload a square image in your ticket.",
+                       colour=EMBED_COLOUR)
+    em.add_field(name="Entries", value=entries_value, inline=True)
+    em.add_field(name="Voting", value=f"Each round runs **{humanize_seconds(vote_sec)}**", inline=True)
+    return em
+
 # ------------- Images -------------
+CDN_HOSTS = ("cdn.discordapp.com", "media.discordapp.net")
+
+async def warm_cdn():
+    """Resolve and connect to the attachment CDN hosts so the first round post finds a hot pool."""
+    async def touch(host: str):
+        async with bot.get_http().head(f"https://{host}/"):
+            pass
+    await asyncio.gather(*(touch(h) for h in CDN_HOSTS), return_exceptions=True)
+
+# the same looks come back every round (match card, result thumbnail, champion)
+IMG_CACHE_TTL = 3600
+IMG_CACHE_BYTES = 128 * 1024 * 1024
+# url -> (fetched at, bytes); insertion order is recency, oldest first
+_img_cache: dict[str, tuple[float, bytes]] = {}
+_img_cache_size = 0
+_img_inflight: dict[str, asyncio.Future] = {}
+
+def _img_cache_put(url: str, now: float, data: bytes):
+    global _img_cache_size
+    old = _img_cache.pop(url, None)
+    if old:
+        _img_cache_size -= len(old[1])
+    _img_cache[url] = (now, data)
+    _img_cache_size += len(data)
+    while _img_cache_size > IMG_CACHE_BYTES and _img_cache:
+        oldest = next(iter(_img_cache))
+        _img_cache_size -= len(_img_cache.pop(oldest)[1])
+
 async def fetch_image_bytes(url: str) -> bytes | None:
+    now = asyncio.get_running_loop().time()
+    hit = _img_cache.get(url)
+    if hit and now - hit[0] < IMG_CACHE_TTL:
+        # refresh recency without resetting the TTL clock
+        _img_cache[url] = _img_cache.pop(url)
+        return hit[1]
+    # a round's cards and thumbnails are prepared concurrently and often share a look;
+    # callers that miss on the same url wait on the one download already in flight
+    pending = _img_inflight.get(url)
+    if pending is not None:
+        return await asyncio.shield(pending)
+    # shielded, so a cancelled caller doesn't abort the download for the others
+    task = asyncio.ensure_future(_download_image(url, now))
+    _img_inflight[url] = task
+    task.add_done_callback(lambda _t: _img_inflight.pop(url, None))
+    return await asyncio.shield(task)
+
+async def _download_image(url: str, now: float) -> bytes | None:
     try:
-        async with aiohttp.ClientSession() as s:
-            async with s.get(url) as r:
-                if r.status == 200:
-                    return await r.read()
+        async with bot.get_http().get(url) as r:
+            if r.status != 200:
+                return None
+            data = await r.read()
     except Exception:
         return None
-    return None
-
-async def build_vs_card(left_url: str, right_url: str, width: int = 1200, gap: int = 24) -> io.BytesIO:
-    async with aiohttp.ClientSession() as s:
-        Lb = await (await s.get(left_url)).read()
-        Rb = await (await s.get(right_url)).read()
-    L = Image.open(io.BytesIO(Lb)).convert("RGB")
-    R = Image.open(io.BytesIO(Rb)).convert("RGB")
+    _img_cache_put(url, now, data)
+    return data
+
+# VS cards are composed off-loop; PIL's decode, resample and encode release the GIL,
+# so threads run in parallel without shipping image bytes to another process;
+# one worker per core, capped at the 4 cards post_round_matches prepares at once
+_CARD_POOL = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="stylo-card")
+
+def _has_alpha(im: Image.Image) -> bool:
+    return im.mode in ("RGBA", "LA", "PA") or "transparency" in im.info
+
+def _flatten(im: Image.Image, bg=(20,20,30)) -> Image.Image:
+    if not _has_alpha(im):
+        return im.convert("RGB")
+    base = Image.new("RGB", im.size, bg)
+    rgba = im.convert("RGBA")
+    base.paste(rgba, mask=rgba)
+    return base
+
+def _smart_contain(im: Image.Image, box: tuple[int, int]) -> Image.Image:
+    # box-filter big downscales to ~2x the target in C, then LANCZOS the rest
+    n = min(max(1, im.width // (box[0]*2)), max(1, im.height // (box[1]*2)))
+    if n > 1:
+        im = im.reduce(n)
+    return ImageOps.contain(im, box, method=Image.LANCZOS)
+
+def _compose_vs(Lb: bytes, Rb: bytes, width: int = 1200, gap: int = 24) -> tuple[bytes, str]:
     tile_w = (width - gap)//2
     max_h = int(tile_w * 2.0)
-    Lc = ImageOps.contain(L, (tile_w, max_h), method=Image.LANCZOS)
-    Rc = ImageOps.contain(R, (tile_w, max_h), method=Image.LANCZOS)
+    L = Image.open(io.BytesIO(Lb))
+    R = Image.open(io.BytesIO(Rb))
+    # JPEGs decode straight at 1/2, 1/4 or 1/8 scale when that still covers the tile
+    L.draft("RGB", (tile_w, max_h))
+    R.draft("RGB", (tile_w, max_h))
+    # cut-outs and graphics keep lossless edges; photos go out as WebP
+    lossless = _has_alpha(L) or _has_alpha(R)
+    L, R = _flatten(L), _flatten(R)
+    Lc = _smart_contain(L, (tile_w, max_h))
+    Rc = _smart_contain(R, (tile_w, max_h))
     h = max(Lc.height, Rc.height)
-    def tile(img):
-        t = Image.new("RGB", (tile_w, h), (20,20,30))
-        t.paste(img, ((tile_w-img.width)//2, (h-img.height)//2))
-        return t
+    # canvas is already the pad colour, so each side is centred straight onto it
     canvas = Image.new("RGB", (width, h), (20,20,30))
-    canvas.paste(tile(Lc), (0,0))
-    canvas.paste(tile(Rc), (tile_w+gap,0))
-    ImageDraw.Draw(canvas).rectangle([tile_w,0,tile_w+gap,h], fill=(45,45,60))
-    out = io.BytesIO(); canvas.save(out, format="PNG", optimize=True); out.seek(0)
-    return out
-
-async def fetch_latest_ticket_image_url(guild: discord.Guild, entrant_id: int) -> str | None:
-    con = db()
-    cur = con.cursor()
-    cur.execute("SELECT channel_id FROM ticket WHERE entrant_id=?", (entrant_id,))
-    row = cur.fetchone()
-    con.close()
-
-    if not row:
-        return None
+    canvas.paste(Lc, ((tile_w-Lc.width)//2, (h-Lc.height)//2))
+    canvas.paste(Rc, (tile_w+gap + (tile_w-Rc.width)//2, (h-Rc.height)//2))
+    canvas.paste((45,45,60), (tile_w, 0, tile_w+gap, h))  # divider: a solid fill, no Draw object
+    out = io.BytesIO()
+    if lossless:
+        canvas.save(out, format="PNG")
+        return out.getvalue(), "png"
+    canvas.save(out, format="WEBP", quality=85, method=4)
+    return out.getvalue(), "webp"
+
+async def _fetch_raw(url: str) -> bytes:
+    data = await fetch_image_bytes(url)
+    if data is None:
+        raise ValueError(f"image fetch failed: {url}")
+    return data
+
+async def build_vs_card(left_url: str, right_url: str, width: int = 1200, gap: int = 24) -> tuple[io.BytesIO, str]:
+    """Returns the card and its file extension ("webp", or "png" when a source had transparency)."""
+    Lb, Rb = await asyncio.gather(_fetch_raw(left_url), _fetch_raw(right_url))
+    card, ext = await asyncio.get_running_loop().run_in_executor(_CARD_POOL, _compose_vs, Lb, Rb, width, gap)
+    return io.BytesIO(card), ext
 
-    ch = guild.get_channel(row["channel_id"])
-    if not isinstance(ch, discord.TextChannel):
-        return None
+# ------------- Voting UI -------------
+class VoteRejected(Exception):
+    """Raised inside the vote transaction to roll it back with a user-facing reason."""
 
-    async for msg in ch.history(limit=200, oldest_first=False):
-        if msg.author.bot:
-            continue
-        for a in msg.attachments:
-            ctype_ok = (a.content_type or "").startswith("image/")
-            name = (a.filename or "").lower().split("?")[0]
-            ext = name.rsplit(".", 1)[-1] if "." in name else ""
-            if ctype_ok or ext in {
-                "png", "jpg", "jpeg", "gif", "webp", "heic",
-                "heif", "bmp", "tif", "tiff"
-            }:
-                return a.url
+# one pending live-total edit per message, so a burst of votes costs one REST call
+TOTALS_EDIT_DELAY = 0.8
+_pending_edits: dict[int, asyncio.Task] = {}
+# messages that took a vote while their edit was already under way; the task goes round again
+_stale_totals: set[int] = set()
 
-    return None
+async def _flush_totals_edit(message: discord.Message, match_id: int):
+    try:
+        while True:
+            await asyncio.sleep(TOTALS_EDIT_DELAY)
+            _stale_totals.discard(message.id)
+            if not message.embeds:
+                return
+            # same channel bucket as the posts, so it queues behind them like any send
+            await send_pacer.wait(message.channel.id)
+            async with send_admission:
+                # read as late as possible so the edit carries every vote before it
+                cur = db().cursor()
+                cur.execute(_SQL_MATCH_TOTALS, (match_id,))
+                row = cur.fetchone()
+                if not row:
+                    return
+                total = row["left_votes"] + row["right_votes"]
+                em = message.embeds[0]
+                if em.fields:
+                    em.set_field_at(0, name="Live totals", value=f"Total votes: **{total}**", inline=False)
+                else:
+                    em.add_field(name="Live totals", value=f"Total votes: **{total}**", inline=False)
+                try:
+                    await message.edit(embed=em)
+                except Exception as e:
+                    log.warning("live totals edit failed: %s", e)
+            if message.id not in _stale_totals:
+                return
+    finally:
+        _pending_edits.pop(message.id, None)
+        _stale_totals.discard(message.id)
 
+def schedule_totals_edit(message: discord.Message, match_id: int):
+    """Queue a live-total refresh; votes landing before it fires ride along."""
+    if message.id in _pending_edits:
+        _stale_totals.add(message.id)
+    else:
+        _pending_edits[message.id] = asyncio.create_task(_flush_totals_edit(message, match_id))
 
-# ------------- Voting UI -------------
 class MatchView(discord.ui.View):
     def __init__(
         self,
@@ -388,14 +693,19 @@ class MatchView(discord.ui.View):
         left_label: str,
         right_label: str,
         chat_url: str | None = None,
+        persistent: bool = False,
     ):
-        timeout = max(1, int((end_utc - datetime.now(timezone.utc)).total_seconds()))
+        # persistent copies are registered at startup and must not time out
+        timeout = None if persistent else max(1, int((end_utc - datetime.now(timezone.utc)).total_seconds()))
         super().__init__(timeout=timeout)
         self.match_id = match_id
         self.message: discord.Message | None = None  # filled after send
 
         self.btn_left.label = f"Vote {left_label}"
         self.btn_right.label = f"Vote {right_label}"
+        # per-match ids so one registered view serves the main post and every bump panel
+        self.btn_left.custom_id = f"stylo:vote:{match_id}:L"
+        self.btn_right.custom_id = f"stylo:vote:{match_id}:R"
         if chat_url:
             self.add_item(
                 discord.ui.Button(
@@ -404,81 +714,33 @@ class MatchView(discord.ui.View):
             )
 
     async def _vote(self, interaction: discord.Interaction, side: str):
+        # voter row and tally land together or not at all; the tally UPDATE hands
+        # back the new totals and end time, so there's no SELECT before or after
+        dl, dr = (1, 0) if side == "L" else (0, 1)
         try:
-            con = db()
-            cur = con.cursor()
-            cur.execute(
-                "SELECT left_votes, right_votes, end_utc FROM match WHERE id=?",
-                (self.match_id,),
-            )
-            row = cur.fetchone()
-            if not row:
-                await interaction.response.send_message(
-                    "Match not found.", ephemeral=True
-                )
-                return
-            end_dt = datetime.fromisoformat(row["end_utc"]).replace(
-                tzinfo=timezone.utc
-            )
-            if datetime.now(timezone.utc) >= end_dt:
-                await interaction.response.send_message(
-                    "Voting has ended for this match.", ephemeral=True
-                )
-                return
-            try:
-                cur.execute(
-                    "INSERT INTO voter(match_id,user_id,side) VALUES(?,?,?)",
-                    (self.match_id, interaction.user.id, side),
-                )
-            except sqlite3.IntegrityError:
-                await interaction.response.send_message(
-                    "You’ve already voted here.", ephemeral=True
-                )
-                return
-            if side == "L":
-                cur.execute(
-                    "UPDATE match SET left_votes=left_votes+1 WHERE id=?",
-                    (self.match_id,),
-                )
-            else:
-                cur.execute(
-                    "UPDATE match SET right_votes=right_votes+1 WHERE id=?",
-                    (self.match_id,),
-                )
-            con.commit()
-            cur.execute(
-                "SELECT left_votes,right_votes FROM match WHERE id=?",
-                (self.match_id,),
-            )
-            m = cur.fetchone()
-            L, R = m["left_votes"], m["right_votes"]
-            total = L + R
-        finally:
-            try:
-                con.close()
-            except:
-                pass
+            with transaction(db()) as tx:
+                tx.execute(_SQL_VOTE_INSERT, (self.match_id, interaction.user.id, side))
+                if tx.rowcount == 0:
+                    raise VoteRejected("You’ve already voted here.")
+                tx.execute(_SQL_VOTE_INCR, (dl, dr, self.match_id))
+                row = tx.fetchone()
+                if not row:
+                    raise VoteRejected("Match not found.")
+                L, R, end_utc = row
+                end_dt = datetime.fromisoformat(end_utc).replace(tzinfo=timezone.utc)
+                if datetime.now(timezone.utc) >= end_dt:
+                    raise VoteRejected("Voting has ended for this match.")
+        except VoteRejected as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
+            return
+        total = L + R
 
-        if interaction.message and interaction.message.embeds:
-            em = interaction.message.embeds[0]
-            if em.fields:
-                em.set_field_at(
-                    0,
-                    name="Live totals",
-                    value=f"Total votes: **{total}**",
-                    inline=False,
-                )
-            else:
-                em.add_field(
-                    name="Live totals",
-                    value=f"Total votes: **{total}**",
-                    inline=False,
-                )
-            await interaction.response.edit_message(embed=em, view=self)
-        else:
-            await interaction.response.edit_message(view=self)
+        # ack now; the live total on the post is refreshed by a coalesced edit
+        await interaction.response.defer()
+        if interaction.message:
+            schedule_totals_edit(interaction.message, self.match_id)
 
-        pa = math.floor((L / total) * 100) if total else 0
+        pa = (L * 100 + total // 2) // total if total else 0
         if total >= 2:
             if pa >= 80:
                 banter = "That’s a rinse."
@@ -516,7 +778,31 @@ class MatchView(discord.ui.View):
             pass
 
 
+def register_open_match_views():
+    """Re-attach vote buttons for undecided matches so they survive a restart."""
+    con = db(); cur = con.cursor()
+    cur.execute(
+        "SELECT match.id, match.end_utc FROM match "
+        "JOIN event ON event.guild_id = match.guild_id AND event.round_index = match.round_index "
+        "WHERE event.state='voting' AND match.winner_id IS NULL AND match.msg_id IS NOT NULL"
+    )
+    rows = cur.fetchall()
+    for r in rows:
+        end_dt = datetime.fromisoformat(r["end_utc"]).replace(tzinfo=timezone.utc)
+        bot.add_view(MatchView(r["id"], end_dt, "Left", "Right", persistent=True))
+
+
 # ------------- Posting matches -------------
+def build_match_embed(round_index: int, Lname: str, Rname: str, vote_end: datetime) -> discord.Embed:
+    em = discord.Embed(
+        title=f"Round {round_index} — {Lname} vs {Rname}",
+        description="Tap a button to vote. One vote per person.",
+        colour=EMBED_COLOUR,
+    )
+    em.add_field(name="Live totals", value="Total votes: **0**", inline=False)
+    em.add_field(name="Closes", value=rel_ts(vote_end), inline=False)
+    return em
+
 async def post_round_matches(ev, round_index: int, vote_end: datetime, con, cur):
     guild = bot.get_guild(ev["guild_id"])
     ch = guild.get_channel(ev["main_channel_id"]) if (guild and ev["main_channel_id"]) else (guild.system_channel if guild else None)
@@ -526,60 +812,244 @@ async def post_round_matches(ev, round_index: int, vote_end: datetime, con, cur)
     th_id = await ensure_event_chat_thread(guild, ch, ev)
     url = chat_jump_url(guild, th_id)
 
+    # unposted matches with both entrants joined in, one read for the whole round
     cur.execute(
-        "SELECT * FROM match WHERE guild_id=? AND round_index=? AND msg_id IS NULL",
+        "SELECT m.id, el.name, el.image_url, er.name, er.image_url FROM match m "
+        "LEFT JOIN entrant el ON el.id = m.left_id "
+        "LEFT JOIN entrant er ON er.id = m.right_id "
+        "WHERE m.guild_id=? AND m.round_index=? AND m.msg_id IS NULL",
         (ev["guild_id"], round_index)
     )
-    rows = cur.fetchall()
 
-    for m in rows:
-        cur.execute("SELECT name,image_url FROM entrant WHERE id=?", (m["left_id"],))
-        L = cur.fetchone()
-        cur.execute("SELECT name,image_url FROM entrant WHERE id=?", (m["right_id"],))
-        R = cur.fetchone()
+    # rows unpack positionally; keyed Row lookups scan column names on every access
+    plans = [
+        (mid, Lname or "Left", Rname or "Right", (Lurl or "").strip(), (Rurl or "").strip())
+        for mid, Lname, Lurl, Rname, Rurl in cur.fetchall()
+    ]
 
-        Lname = (L["name"] if L else "Left")
-        Rname = (R["name"] if R else "Right")
-        Lurl = (L["image_url"] or "").strip() if L else ""
-        Rurl = (R["image_url"] or "").strip() if R else ""
+    # stage 1: fetch + compose runs ahead of the sends, a few matches at a time
+    prep_sem = asyncio.Semaphore(4)
+    async def prepare(Lurl: str, Rurl: str) -> tuple[io.BytesIO, str] | None:
+        async with prep_sem:
+            try:
+                if Lurl and Rurl:
+                    # single composite image attached to the embed
+                    card, ext = await build_vs_card(Lurl, Rurl)
+                    return card, f"versus.{ext}"
+                if Lurl or Rurl:
+                    # only one look has an image
+                    data = await fetch_image_bytes(Lurl or Rurl)
+                    if data:
+                        return io.BytesIO(data), "look.png"
+            except Exception:
+                pass
+            return None
 
-        em = discord.Embed(
-            title=f"Round {round_index} — {Lname} vs {Rname}",
-            description="Tap a button to vote. One vote per person.",
-            colour=EMBED_COLOUR,
-        )
-        em.add_field(name="Live totals", value="Total votes: **0**", inline=False)
-        em.add_field(name="Closes", value=rel_ts(vote_end), inline=False)
+    staged = [asyncio.create_task(prepare(Lurl, Rurl)) for _, _, _, Lurl, Rurl in plans]
 
-        view = MatchView(m["id"], vote_end, Lname, Rname, chat_url=url)
+    # stage 2: sends go out one by one, in bracket order
+    try:
+        for (mid, Lname, Rname, _, _), task in zip(plans, staged):
+            em = build_match_embed(round_index, Lname, Rname, vote_end)
+            view = MatchView(mid, vote_end, Lname, Rname, chat_url=url)
 
-        msg = None
+            msg = None
+            image = await task
+            if image:
+                fp, filename = image
+                em.set_image(url=f"attachment://{filename}")
+                try:
+                    await send_pacer.wait(ch.id)
+                    async with send_admission:
+                        msg = await ch.send(embed=em, view=view, file=discord.File(fp, filename=filename))
+                except Exception:
+                    msg = None
+
+            if msg is None:
+                # the image path may have pointed em at an attachment that never went up
+                if em.image:
+                    em = build_match_embed(round_index, Lname, Rname, vote_end)
+                await send_pacer.wait(ch.id)
+                async with send_admission:
+                    msg = await ch.send(embed=em, view=view)
+
+            view.message = msg
+            # record it right away: bump panels and the restart re-registration both
+            # treat a match without msg_id as unposted
+            cur.execute(_SQL_MATCH_SET_MSG, (msg.id, mid))
+    finally:
+        for task in staged:
+            task.cancel()
+
+# ------------- Round outcomes (tie-breaks + results) -------------
+async def _tie_card(Lurl: str, Rurl: str) -> tuple[io.BytesIO, str]:
+    card, ext = await build_vs_card(Lurl, Rurl)
+    return card, f"tie.{ext}"
+
+THUMB_MAX_BYTES = 512 * 1024
+THUMB_SIDE = 512
+
+def _shrink_thumb(data: bytes) -> tuple[bytes, str]:
+    im = Image.open(io.BytesIO(data))
+    im.draft("RGB", (THUMB_SIDE, THUMB_SIDE))
+    alpha = _has_alpha(im)
+    im = im.convert("RGBA" if alpha else "RGB")
+    im.thumbnail((THUMB_SIDE, THUMB_SIDE), Image.LANCZOS)
+    out = io.BytesIO()
+    if alpha:
+        im.save(out, format="PNG")
+        return out.getvalue(), "png"
+    im.save(out, format="JPEG", quality=85)
+    return out.getvalue(), "jpg"
+
+async def _winner_image(url: str, match_id: int) -> tuple[io.BytesIO, str] | None:
+    data = await fetch_image_bytes(url)
+    if not data:
+        return None
+    ext = "png"
+    # it only shows as a thumbnail; big originals are shrunk off-loop before upload
+    if len(data) > THUMB_MAX_BYTES:
         try:
-            if Lurl and Rurl:
-                # single composite image attached to the embed
-                card = await build_vs_card(Lurl, Rurl)
-                file = discord.File(fp=card, filename="versus.png")
-                em.set_image(url="attachment://versus.png")
-                msg = await ch.send(embed=em, view=view, file=file)
-            elif Lurl or Rurl:
-                # only one look has an image
-                one_url = Lurl or Rurl
-                data = await fetch_image_bytes(one_url)
-                if data:
-                    file = discord.File(io.BytesIO(data), filename="look.png")
-                    em.set_image(url="attachment://look.png")
-                    msg = await ch.send(embed=em, view=view, file=file)
+            data, ext = await asyncio.get_running_loop().run_in_executor(_CARD_POOL, _shrink_thumb, data)
         except Exception:
-            msg = None
+            pass
+    return io.BytesIO(data), f"winner_{match_id}.{ext}"
 
-        if msg is None:
-            msg = await ch.send(embed=em, view=view)
+async def announce_outcomes(ch, items: list):
+    """
+    items: (embed, view | None, image factory | None, as_thumbnail); a factory is an
+    async callable, only called here, so nothing is started for items that never send.
+    Image work for every item runs ahead, a few at a time; sends go out in order.
+    Runs of items without a view (results) share a message, up to Discord's 10 embeds each.
+    """
+    sem = asyncio.Semaphore(4)
+    async def prep(factory):
+        async with sem:
+            try:
+                return await factory()
+            except Exception:
+                return None
+
+    async def send(batch: list, view=None):
+        files = []
+        for _, image in batch:
+            if image:
+                fp, filename = image
+                fp.seek(0)
+                files.append(discord.File(fp, filename=filename))
+        await send_pacer.wait(ch.id)
+        async with send_admission:
+            msg = await ch.send(embeds=[em for em, _ in batch], view=view, files=files or None)
+        if view:
+            view.message = msg
+
+    async def flush(batch: list):
+        if not batch:
+            return
+        try:
+            await send(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                log.warning("outcome send failed: %s", e)
+            else:
+                # one bad attachment shouldn't sink the whole batch; go one by one
+                for one in batch:
+                    try:
+                        await send([one])
+                    except Exception as e1:
+                        log.warning("outcome send failed: %s", e1)
+        finally:
+            batch.clear()
 
-        view.message = msg
+    staged = [asyncio.create_task(prep(f)) if f else None for _, _, f, _ in items]
+    results: list = []
+    try:
+        for (em, view, _, as_thumbnail), task in zip(items, staged):
+            image = await task if task else None
+            if image and as_thumbnail:
+                em.set_thumbnail(url=f"attachment://{image[1]}")
+            if view is None:
+                results.append((em, image))
+                if len(results) == 10:
+                    await flush(results)
+                continue
+            # a view belongs to one message, so it goes out on its own, in order
+            await flush(results)
+            try:
+                await send([(em, image)], view)
+            except Exception as e:
+                log.warning("outcome send failed: %s", e)
+        await flush(results)
+    finally:
+        for task in staged:
+            if task:
+                task.cancel()
+
+def tie_item(match_id: int, new_end: datetime, Lname: str, Rname: str, Lurl: str, Rurl: str) -> tuple:
+    em = discord.Embed(
+        title=f"🔁 Tie-break — {Lname} vs {Rname}",
+        description=f"Re-vote open until {rel_ts(new_end)}.",
+        colour=discord.Colour.orange(),
+    )
+    card = partial(_tie_card, Lurl, Rurl) if (Lurl and Rurl) else None
+    return em, MatchView(match_id, new_end, Lname, Rname), card, False
+
+def result_item(match_id: int, Lname: str, Rname: str, L: int, R: int, w_uid: int | None, wurl: str) -> tuple:
+    total = max(1, L + R)
+    pL = round((L / total) * 100, 1)
+    pR = round((R / total) * 100, 1)
+    winner_mention = f"<@{w_uid}>" if w_uid else "the winner"
+    em = discord.Embed(
+        title=f"🏁 Result — {Lname} vs {Rname}",
+        description=(f"**{Lname}**: {L} ({pL}%)\n"
+                     f"**{Rname}**: {R} ({pR}%)\n\n"
+                     f"🏆 **Winner:** {winner_mention}"),
+        colour=discord.Colour.green()
+    )
+    return em, None, partial(_winner_image, wurl, match_id) if wurl else None, True
 
-        cur.execute("UPDATE match SET msg_id=? WHERE id=?", (msg.id, m["id"]))
-        con.commit()
-        await asyncio.sleep(0.2)
+async def settle_round(ev, matches: list, now: datetime, con, ch) -> bool:
+    """
+    Close out a round's open matches (rows from _SQL_ROUND_OPEN_MATCHES): ties re-open
+    for another voting window, everything else gets its winner. Shared by the scheduler
+    and /stylo_finish_round_now. Returns True when any match tied and the round was extended.
+    """
+    vote_sec = event_vote_seconds(ev)
+    outcomes = []
+    tied: list[int] = []
+    decided: list[tuple[int, str, int]] = []
+    # every tie in the round re-opens until the same moment
+    new_end = now + timedelta(seconds=vote_sec)
+    new_end_iso, now_iso = new_end.isoformat(), now.isoformat()
+    for m in matches:
+        L, R = m["left_votes"], m["right_votes"]
+        Lname = m["lname"] or "Left"
+        Rname = m["rname"] or "Right"
+        Lurl = (m["l_img"] or "").strip()
+        Rurl = (m["r_img"] or "").strip()
+        if L == R:
+            tied.append(m["id"])
+            if ch:
+                outcomes.append(tie_item(m["id"], new_end, Lname, Rname, Lurl, Rurl))
+            continue
+        winner_id = m["left_id"] if L > R else m["right_id"]
+        decided.append((winner_id, now_iso, m["id"]))
+        if ch:
+            w_uid, wurl = (m["l_uid"], Lurl) if winner_id == m["left_id"] else (m["r_uid"], Rurl)
+            outcomes.append(result_item(m["id"], Lname, Rname, L, R, w_uid, wurl))
+
+    # settle the whole round in one transaction; announcements go out after.
+    # every open match is settled here, so the re-opened ties are all that's left
+    # and the round now ends at their shared new_end
+    with transaction(con) as tx:
+        tx.executemany(_SQL_MATCH_TIE_RESET, [(new_end_iso, mid) for mid in tied])
+        tx.executemany(_SQL_VOTER_CLEAR, [(mid,) for mid in tied])
+        tx.executemany(_SQL_MATCH_SET_WINNER, decided)
+        if tied:
+            tx.execute(_SQL_EVENT_EXTEND_ROUND, (new_end_iso, ev["guild_id"]))
+    if outcomes:
+        await announce_outcomes(ch, outcomes)
+    return bool(tied)
 
 # ------------- Round advance -------------
 async def _disable_all_join_buttons(ch: discord.TextChannel):
@@ -604,86 +1074,59 @@ async def _disable_all_join_buttons(ch: discord.TextChannel):
                 pass
 async def lock_past_theme_chats(guild):
     """Lock all previous Stylo theme chat threads."""
-    con = db(); cur = con.cursor()
-    cur.execute("SELECT msg_id FROM bump_panel WHERE guild_id=?", (guild.id,))
-    rows = cur.fetchall()
-    con.close()
-
-    for r in rows:
-        for ch in guild.text_channels:
+    if not guild:
+        return
+    # the bot's own theme chats, from the gateway's active-thread cache; no fetch sweep
+    me = guild.me.id if guild.me else None
+    threads = [t for t in guild.threads
+               if t.owner_id == me and t.name.startswith("🗣 Theme Chat") and not t.locked]
+    sem = asyncio.Semaphore(5)
+    async def _lock(th: discord.Thread):
+        async with sem:
             try:
-                msg = await ch.fetch_message(r["msg_id"])
-                thread = msg.channel
-                if isinstance(thread, discord.Thread):
-                    # Lock thread for everyone
-                    overwrites = thread.overwrites_for(guild.default_role)
-                    overwrites.send_messages = False
-                    await thread.set_permissions(guild.default_role, overwrite=overwrites)
-            except:
+                await th.edit(locked=True, reason="Stylo theme chat closed")
+            except Exception:
                 pass
+    await asyncio.gather(*(_lock(th) for th in threads))
 
 async def advance_to_next_round(ev, now, con, cur, guild, ch):
     gid = ev["guild_id"]
     cur_round = ev["round_index"]
-    vote_sec = ev["vote_seconds"] if ev["vote_seconds"] else int(ev["vote_hours"]) * 3600
+    vote_sec = event_vote_seconds(ev)
 
-    # winners from this round (de-duped so one player can't appear twice)
+    # one pass over this round: winners (de-duped so one player can't appear twice)
+    # and the strongest loser, by losing votes then total votes
     cur.execute(
-        "SELECT winner_id FROM match WHERE guild_id=? AND round_index=?",
+        "SELECT left_id,right_id,left_votes,right_votes,winner_id "
+        "FROM match WHERE guild_id=? AND round_index=?",
         (gid, cur_round)
     )
-    winners_raw = [r["winner_id"] for r in cur.fetchall() if r["winner_id"]]
-
     seen = set()
     winners: list[int] = []
-    for wid in winners_raw:
-        if wid and wid not in seen:
+    best_loser: tuple[int, int] | None = None
+    best_loser_id: int | None = None
+    for left_id, right_id, lv, rv, wid in cur.fetchall():
+        if not wid:
+            continue
+        if wid not in seen:
             seen.add(wid)
             winners.append(wid)
-
-    # helper: pick strongest loser from THIS round
-    def pick_opponent():
-        cur.execute(
-            "SELECT left_id,right_id,left_votes,right_votes,winner_id "
-            "FROM match WHERE guild_id=? AND round_index=?",
-            (gid, cur_round)
-        )
-        rows = cur.fetchall()
-        losers = []
-        for m in rows:
-            if not m["winner_id"]:
-                continue
-            if m["winner_id"] == m["left_id"]:
-                losers.append(
-                    (m["right_id"], m["right_votes"], m["left_votes"] + m["right_votes"])
-                )
-            else:
-                losers.append(
-                    (m["left_id"], m["left_votes"], m["left_votes"] + m["right_votes"])
-                )
-        if not losers:
-            return None
-        # losing votes desc, then total votes desc
-        losers.sort(key=lambda t: (t[1], t[2]), reverse=True)
-        return losers[0][0]
+        loser_id, loser_votes = (right_id, rv) if wid == left_id else (left_id, lv)
+        key = (loser_votes, lv + rv)
+        if best_loser is None or key > best_loser:
+            best_loser, best_loser_id = key, loser_id
 
     # detect any entrant that has NEVER played yet (true leftover from odd entrants)
-    cur.execute(
-        "SELECT left_id,right_id FROM match WHERE guild_id=? AND round_index<=?",
-        (gid, cur_round)
-    )
-    used_ids: set[int] = set()
-    for row in cur.fetchall():
-        used_ids.add(row["left_id"])
-        used_ids.add(row["right_id"])
-
     cur.execute(
         "SELECT id FROM entrant "
-        "WHERE guild_id=? AND image_url IS NOT NULL AND TRIM(image_url)<>''",
-        (gid,)
+        "WHERE guild_id=? AND image_url IS NOT NULL AND TRIM(image_url)<>'' "
+        "AND id NOT IN ("
+        "  SELECT left_id FROM match WHERE guild_id=? AND round_index<=? "
+        "  UNION ALL SELECT right_id FROM match WHERE guild_id=? AND round_index<=?"
+        ")",
+        (gid, gid, cur_round, gid, cur_round)
     )
-    all_ids = {r["id"] for r in cur.fetchall()}
-    unpaired = [pid for pid in all_ids - used_ids]
+    unpaired = [r["id"] for r in cur.fetchall()]
 
     # ===== ROUND 1 SPECIAL: leftover odd entrant vs Round 1 loser =====
     # Rule:
@@ -692,20 +1135,17 @@ async def advance_to_next_round(ev, now, con, cur, guild, ch):
     #   they do a Special Match vs strongest loser from Round 1.
     if cur_round == 1 and unpaired:
         leftover = unpaired[0]
-        opp = pick_opponent()
+        opp = best_loser_id
         if opp is not None:
             vote_end2 = now + timedelta(seconds=vote_sec)
-            cur.execute(
-                "INSERT INTO match(guild_id,round_index,left_id,right_id,end_utc) "
-                "VALUES(?,?,?,?,?)",
-                (gid, cur_round, leftover, opp, vote_end2.isoformat())
-            )
-            con.commit()
-            cur.execute(
-                "UPDATE event SET entry_end_utc=?, state='voting' WHERE guild_id=?",
-                (vote_end2.isoformat(), gid)
-            )
-            con.commit()
+            end2_iso = vote_end2.isoformat()
+            with transaction(con) as tx:
+                tx.execute(_SQL_MATCH_INSERT, (gid, cur_round, leftover, opp, end2_iso))
+                tx.execute(
+                    "UPDATE event SET entry_end_utc=?, state='voting' WHERE guild_id=?",
+                    (end2_iso, gid)
+                )
+            forget_event(gid)
             if ch:
                 await ch.send(embed=discord.Embed(
                     title="🆚 Stylo — Special Match",
@@ -722,8 +1162,8 @@ async def advance_to_next_round(ev, now, con, cur, guild, ch):
     # ===== REAL CHAMPION: only one winner left and no leftovers =====
     if len(winners) == 1 and not unpaired:
         champ_id = winners[0]
-        cur.execute("UPDATE event SET state='closed' WHERE guild_id=?", (gid,))
-        con.commit()
+        cur.execute(_SQL_EVENT_CLOSE, (gid,))
+        forget_event(gid)
 
         cur.execute(
             "SELECT name,image_url,user_id FROM entrant WHERE id=?",
@@ -766,20 +1206,17 @@ async def advance_to_next_round(ev, now, con, cur, guild, ch):
     if cur_round >= 2 and len(winners) % 2 == 1 and len(winners) >= 3:
         # pick one winner as leftover (e.g. last one after sort)
         leftover = sorted(winners)[-1]
-        opp = pick_opponent()
+        opp = best_loser_id
         if opp is not None:
             vote_end2 = now + timedelta(seconds=vote_sec)
-            cur.execute(
-                "INSERT INTO match(guild_id,round_index,left_id,right_id,end_utc) "
-                "VALUES(?,?,?,?,?)",
-                (gid, cur_round, leftover, opp, vote_end2.isoformat())
-            )
-            con.commit()
-            cur.execute(
-                "UPDATE event SET entry_end_utc=?, state='voting' WHERE guild_id=?",
-                (vote_end2.isoformat(), gid)
-            )
-            con.commit()
+            end2_iso = vote_end2.isoformat()
+            with transaction(con) as tx:
+                tx.execute(_SQL_MATCH_INSERT, (gid, cur_round, leftover, opp, end2_iso))
+                tx.execute(
+                    "UPDATE event SET entry_end_utc=?, state='voting' WHERE guild_id=?",
+                    (end2_iso, gid)
+                )
+            forget_event(gid)
             if ch:
                 await ch.send(embed=discord.Embed(
                     title="🆚 Stylo — Special Match",
@@ -798,19 +1235,17 @@ async def advance_to_next_round(ev, now, con, cur, guild, ch):
         nr = cur_round + 1
         vote_end = now + timedelta(seconds=vote_sec)
 
-        for i in range(0, len(winners), 2):
-            if i + 1 < len(winners):
-                cur.execute(
-                    "INSERT INTO match(guild_id,round_index,left_id,right_id,end_utc) "
-                    "VALUES(?,?,?,?,?)",
-                    (gid, nr, winners[i], winners[i + 1], vote_end.isoformat())
-                )
-        con.commit()
-        cur.execute(
-            "UPDATE event SET round_index=?, entry_end_utc=?, state='voting' WHERE guild_id=?",
-            (nr, vote_end.isoformat(), gid)
-        )
-        con.commit()
+        end_iso = vote_end.isoformat()
+        with transaction(con) as tx:
+            tx.executemany(_SQL_MATCH_INSERT, [
+                (gid, nr, left_id, right_id, end_iso)
+                for left_id, right_id in zip(winners[0::2], winners[1::2])
+            ])
+            tx.execute(
+                "UPDATE event SET round_index=?, entry_end_utc=?, state='voting' WHERE guild_id=?",
+                (nr, end_iso, gid)
+            )
+        forget_event(gid)
         if ch:
             await ch.send(embed=discord.Embed(
                 title=f"🆚 Stylo — Round {nr} begins!",
@@ -826,28 +1261,18 @@ async def on_message(message: discord.Message):
     if message.author.bot or not message.guild:
         return
     # image capture into entrant.image_url if in ticket
-    if message.attachments:
-        con = db(); cur = con.cursor()
-        cur.execute(
-            "SELECT entrant.id AS entrant_id FROM ticket "
-            "JOIN entrant ON entrant.id = ticket.entrant_id WHERE ticket.channel_id=?",
-            (message.channel.id,)
-        )
-        row = cur.fetchone(); con.close()
-        if row:
-            img = next((a for a in message.attachments if (a.content_type or "").startswith("image/")), None)
-            if img:
-                con = db(); cur = con.cursor()
-                cur.execute("UPDATE entrant SET image_url=? WHERE id=?", (img.url, row["entrant_id"]))
-                con.commit(); con.close()
-                try: await message.add_reaction("✅")
-                except: pass
+    entrant_id = TICKET_CHANNELS.get(message.channel.id) if message.attachments else None
+    if entrant_id:
+        img = next((a for a in message.attachments if (a.content_type or "").startswith("image/")), None)
+        if img:
+            con = db(); cur = con.cursor()
+            cur.execute(_SQL_ENTRANT_SET_IMAGE, (img.url, entrant_id))
+            try: await message.add_reaction("✅")
+            except: pass
 
     # bump join/vote panels after chat flows
     try:
-        con = db(); cur = con.cursor()
-        cur.execute("SELECT * FROM event WHERE guild_id=? AND state IN ('entry','voting')", (message.guild.id,))
-        ev = cur.fetchone(); con.close()
+        ev = get_active_event(message.guild.id)
         if not ev: return
         if ev["main_channel_id"] != message.channel.id: return
         cid = message.channel.id
@@ -869,6 +1294,13 @@ async def on_message(message: discord.Message):
     finally:
         await bot.process_commands(message)
 
+@bot.event
+async def on_guild_channel_delete(channel: discord.abc.GuildChannel):
+    # a ticket removed by hand would otherwise stay in the map (and the table) until the next reset
+    if TICKET_CHANNELS.pop(channel.id, None) is not None:
+        con = db(); cur = con.cursor()
+        cur.execute("DELETE FROM ticket WHERE channel_id=?", (channel.id,))
+
 async def bump_voting_panels(guild: discord.Guild, ch: discord.TextChannel, ev_row: sqlite3.Row):
     """Post a small 'bump' voting panel only once per open match; never duplicates the main post."""
     if not (guild and ch and ev_row):
@@ -880,63 +1312,55 @@ async def bump_voting_panels(guild: discord.Guild, ch: discord.TextChannel, ev_r
         chat_url = chat_jump_url(guild, thread_id) if thread_id else None
 
     except Exception as e:
-        print("[stylo] bump: ensure event chat failed:", e)
+        log.warning("bump: ensure event chat failed: %s", e)
         chat_url = None
 
     con = db(); cur = con.cursor()
-    try:
-        # Get open matches that are still undecided
-        cur.execute("""
-            SELECT id, left_id, right_id, end_utc, msg_id
-            FROM match
-            WHERE guild_id=? AND round_index=? AND winner_id IS NULL
-        """, (ev_row["guild_id"], ev_row["round_index"]))
-        open_matches = cur.fetchall()
-        if not open_matches:
-            return
-
-        for m in open_matches:
-            # If the main message exists, do NOT bump (avoid double post look)
-            if m["msg_id"]:
-                # additionally ensure we don't have a stale bump saved for this match
-                cur.execute("DELETE FROM bump_panel WHERE guild_id=? AND match_id=?",
-                            (ev_row["guild_id"], m["id"]))
-                con.commit()
-                continue
+    # Get open matches that are still undecided
+    gid, ridx = ev_row["guild_id"], ev_row["round_index"]
+    cur.execute("""
+        SELECT m.id, m.end_utc, m.msg_id, el.name, er.name
+        FROM match m
+        LEFT JOIN entrant el ON el.id = m.left_id
+        LEFT JOIN entrant er ON er.id = m.right_id
+        WHERE m.guild_id=? AND m.round_index=? AND m.winner_id IS NULL
+    """, (gid, ridx))
+    open_matches = cur.fetchall()
+    if not open_matches:
+        return
 
-            # If we already created a bump for this match, skip
-            cur.execute("SELECT 1 FROM bump_panel WHERE guild_id=? AND match_id=? LIMIT 1",
-                        (ev_row["guild_id"], m["id"]))
-            if cur.fetchone():
-                continue
+    for mid, end_utc, msg_id, Lname, Rname in open_matches:
+        # If the main message exists, do NOT bump (avoid double post look)
+        if msg_id:
+            # additionally ensure we don't have a stale bump saved for this match
+            cur.execute(_SQL_BUMP_PANEL_DROP, (gid, mid))
+            continue
 
-            # Names
-            cur.execute("SELECT name FROM entrant WHERE id=?", (m["left_id"],))
-            Lname = (cur.fetchone() or {}).get("name", "Left")
-            cur.execute("SELECT name FROM entrant WHERE id=?", (m["right_id"],))
-            Rname = (cur.fetchone() or {}).get("name", "Right")
+        # If we already created a bump for this match, skip
+        cur.execute(_SQL_BUMP_PANEL_HAS, (gid, mid))
+        if cur.fetchone():
+            continue
 
-            end_dt = datetime.fromisoformat(m["end_utc"]).replace(tzinfo=timezone.utc)
+        Lname, Rname = Lname or "Left", Rname or "Right"
+        end_dt = datetime.fromisoformat(end_utc).replace(tzinfo=timezone.utc)
 
-            em = discord.Embed(
-                title=f"🗳 Voting panel — Round {ev_row['round_index']}",
-                description=f"**{Lname}** vs **{Rname}**\nCloses {rel_ts(end_dt)}",
-                colour=EMBED_COLOUR
-            )
-            view = MatchView(m["id"], end_dt, Lname, Rname, chat_url=chat_url)
+        em = discord.Embed(
+            title=f"🗳 Voting panel — Round {ridx}",
+            description=f"**{Lname}** vs **{Rname}**\nCloses {rel_ts(end_dt)}",
+            colour=EMBED_COLOUR
+        )
+        view = MatchView(mid, end_dt, Lname, Rname, chat_url=chat_url)
 
-            try:
+        try:
+            await send_pacer.wait(ch.id)
+            async with send_admission:
                 sent = await ch.send(embed=em, view=view)
-                view.message = sent
-                # remember we already bumped this match so we won't do it again
-                cur.execute("INSERT OR IGNORE INTO bump_panel(guild_id, match_id, msg_id) VALUES(?,?,?)",
-                            (ev_row["guild_id"], m["id"], sent.id))
-                con.commit()
-                await asyncio.sleep(0.2)
-            except Exception as e:
-                print("[stylo] bump panel send failed:", e)
-    finally:
-        con.close()
+            view.message = sent
+            # remember we already bumped this match so we won't do it again
+            cur.execute(_SQL_BUMP_PANEL_ADD,
+                        (gid, mid, sent.id))
+        except Exception as e:
+            log.warning("bump panel send failed: %s", e)
 
 
 # ------------- Commands -------------
@@ -966,28 +1390,28 @@ class EntrantStartModal(discord.ui.Modal, title="Start Stylo Challenge"):
             await inter.response.send_message("Bad duration. Use numbers + h/m (e.g. 2h, 30m).", ephemeral=True); return
         theme = str(self.theme).strip()
         now = datetime.now(timezone.utc); entry_end = now + timedelta(seconds=entry_sec)
-        con = db(); cur = con.cursor()
-        # reset
-        cur.execute("DELETE FROM match WHERE guild_id=?", (inter.guild_id,))
-        cur.execute("DELETE FROM ticket WHERE entrant_id IN (SELECT id FROM entrant WHERE guild_id=?)", (inter.guild_id,))
-        cur.execute("DELETE FROM entrant WHERE guild_id=?", (inter.guild_id,))
-        con.commit()
-
         # 🔒 lock all past theme chats
         await lock_past_theme_chats(inter.guild)
 
-        cur.execute(
-            "REPLACE INTO event(guild_id,theme,state,entry_end_utc,vote_hours,vote_seconds,round_index,main_channel_id,start_msg_id,round_thread_id) "
-            "VALUES(?,?,?,?,?,?,?,?,?,?)",
-            (inter.guild_id, theme, "entry", entry_end.isoformat(), int(round(vote_sec/3600)), int(vote_sec), 0, inter.channel_id, None, None)
-        )
-        con.commit(); con.close()
+        # reset + new event row in one transaction (nothing awaits inside)
+        con = db()
+        with transaction(con) as tx:
+            tx.execute("DELETE FROM match WHERE guild_id=?", (inter.guild_id,))
+            tx.execute("SELECT ticket.channel_id FROM ticket JOIN entrant ON entrant.id = ticket.entrant_id "
+                       "WHERE entrant.guild_id=?", (inter.guild_id,))
+            stale_tickets = [r["channel_id"] for r in tx.fetchall()]
+            tx.execute("DELETE FROM ticket WHERE entrant_id IN (SELECT id FROM entrant WHERE guild_id=?)", (inter.guild_id,))
+            tx.execute("DELETE FROM entrant WHERE guild_id=?", (inter.guild_id,))
+            tx.execute(
+                "REPLACE INTO event(guild_id,theme,state,entry_end_utc,vote_hours,vote_seconds,round_index,main_channel_id,start_msg_id,round_thread_id) "
+                "VALUES(?,?,?,?,?,?,?,?,?,?)",
+                (inter.guild_id, theme, "entry", entry_end.isoformat(), int(round(vote_sec/3600)), int(vote_sec), 0, inter.channel_id, None, None)
+            )
+        forget_event(inter.guild_id)
+        for cid in stale_tickets:
+            TICKET_CHANNELS.pop(cid, None)
 
-        em = discord.Embed(title=f"✨ Stylo: {theme}" if theme else "✨ Stylo",
-                           description="Entries are now **open**!\nTap **Join** to submit your entry. Upload a square image in your ticket.",
-                           colour=EMBED_COLOUR)
-        em.add_field(name="Entries", value=f"Open for **{humanize_seconds(entry_sec)}**\nCloses {rel_ts(entry_end)}", inline=True)
-        em.add_field(name="Voting", value=f"Each round runs **{humanize_seconds(vote_sec)}**", inline=True)
+        em = build_start_embed(theme, f"Open for **{humanize_seconds(entry_sec)}**\nCloses {rel_ts(entry_end)}", vote_sec)
 
         await inter.response.defer(ephemeral=True)
         msg = await inter.followup.send(embed=em, view=build_join_view(True), wait=True)
@@ -995,7 +1419,6 @@ class EntrantStartModal(discord.ui.Modal, title="Start Stylo Challenge"):
         except: pass
         con = db(); cur = con.cursor()
         cur.execute("UPDATE event SET start_msg_id=? WHERE guild_id=?", (msg.id, inter.guild_id))
-        con.commit(); con.close()
         await inter.followup.send("Stylo’s live and buzzing - jump in and join the fun!", ephemeral=True)
         
         # lock chat now
@@ -1017,7 +1440,7 @@ async def stylo_set_ticket_category(inter: discord.Interaction, category: discor
 @bot.tree.command(name="stylo_state", description="Show current Stylo state (ephemeral).")
 async def stylo_state(inter: discord.Interaction):
     con = db(); cur = con.cursor()
-    cur.execute("SELECT * FROM event WHERE guild_id=?", (inter.guild_id,)); ev = cur.fetchone(); con.close()
+    cur.execute("SELECT * FROM event WHERE guild_id=?", (inter.guild_id,)); ev = cur.fetchone()
     if not ev:
         await inter.response.send_message("No event row.", ephemeral=True); return
     try:
@@ -1046,399 +1469,240 @@ async def stylo_finish_round_now(inter: discord.Interaction):
     cur.execute("SELECT * FROM event WHERE guild_id=? AND state='voting'", (inter.guild_id,))
     ev = cur.fetchone()
     if not ev:
-        con.close(); await inter.followup.send("No round in voting state.", ephemeral=True); return
+        await inter.followup.send("No round in voting state.", ephemeral=True); return
     guild = inter.guild
     ch = guild.get_channel(ev["main_channel_id"]) if (guild and ev["main_channel_id"]) else (guild.system_channel if guild else None)
-    cur.execute("SELECT * FROM match WHERE guild_id=? AND round_index=? AND winner_id IS NULL",
-                (ev["guild_id"], ev["round_index"]))
-    matches = cur.fetchall()
-    vote_sec = ev["vote_seconds"] if ev["vote_seconds"] else int(ev["vote_hours"]) * 3600
-    any_revote = False
-
-    for m in matches:
-        L, R = m["left_votes"], m["right_votes"]
-        cur.execute("SELECT name,image_url FROM entrant WHERE id=?", (m["left_id"],)); Lrow = cur.fetchone()
-        cur.execute("SELECT name,image_url FROM entrant WHERE id=?", (m["right_id"],)); Rrow = cur.fetchone()
-        Lname = Lrow["name"] if Lrow else "Left"
-        Rname = Rrow["name"] if Rrow else "Right"
-        Lurl = (Lrow["image_url"] or "").strip() if Lrow else ""
-        Rurl = (Rrow["image_url"] or "").strip() if Rrow else ""
-        if L == R:
-            any_revote = True
-            new_end = now + timedelta(seconds=vote_sec)
-            cur.execute("UPDATE match SET left_votes=0,right_votes=0,end_utc=?,winner_id=NULL WHERE id=?",
-                        (new_end.isoformat(), m["id"]))
-            cur.execute("DELETE FROM voter WHERE match_id=?", (m["id"],))
-            con.commit()
-            if ch:
-                view = MatchView(m["id"], new_end, Lname, Rname)
-                if Lurl and Rurl:
-                    card = await build_vs_card(Lurl, Rurl)
-                    msg = await ch.send(
-                        embed=discord.Embed(
-                            title=f"🔁 Tie-break — {Lname} vs {Rname}",
-                            description=f"Re-vote open until {rel_ts(new_end)}.",
-                            colour=discord.Colour.orange(),
-                        ),
-                        file=discord.File(card, filename="tie.png"),
-                        view=view,
-                    )
-                else:
-                    msg = await ch.send(
-                        embed=discord.Embed(
-                            title=f"🔁 Tie-break — {Lname} vs {Rname}",
-                            description=f"Re-vote open until {rel_ts(new_end)}.",
-                            colour=discord.Colour.orange(),
-                        ),
-                        view=view,
-                    )
-                view.message = msg
-
-            continue
-        winner_id = m["left_id"] if L > R else m["right_id"]
-        cur.execute("UPDATE match SET winner_id=?, end_utc=? WHERE id=?", (winner_id, now.isoformat(), m["id"]))
-        con.commit()
-    if any_revote:
-        cur.execute("SELECT MAX(end_utc) AS mx FROM match WHERE guild_id=? AND round_index=?",
-                    (ev["guild_id"], ev["round_index"]))
-        mx = cur.fetchone()["mx"]
-        if mx:
-            cur.execute("UPDATE event SET entry_end_utc=?, state='voting' WHERE guild_id=?",
-                        (mx, ev["guild_id"]))
-            con.commit()
-        con.close()
+    cur.execute(_SQL_ROUND_OPEN_MATCHES, (ev["guild_id"], ev["round_index"]))
+    if await settle_round(ev, cur.fetchall(), now, con, ch):
         await inter.followup.send("Round extended due to tie-breaks.", ephemeral=True)
         return
     await cleanup_bump_panels(guild, ch)
     await advance_to_next_round(ev, now, con, cur, guild, ch)
-    con.close()
     await inter.followup.send("Round finished.", ephemeral=True)
 
 async def lock_main_channel(guild, channel):
     """Prevent everyone from chatting during event."""
+    if not (guild and channel):
+        return
     overwrites = channel.overwrites_for(guild.default_role)
+    if overwrites.send_messages is False:
+        return  # already locked; skip the PATCH
     overwrites.send_messages = False
     try:
         await channel.set_permissions(guild.default_role, overwrite=overwrites)
     except Exception as e:
-        print("[stylo] lock perms failed:", e)
+        log.warning("lock perms failed: %s", e)
 
 
 async def unlock_main_channel(guild, channel):
     """Restore chat once event is over."""
+    if not (guild and channel):
+        return
     overwrites = channel.overwrites_for(guild.default_role)
+    if overwrites.send_messages is True:
+        return  # already unlocked; skip the PATCH
     overwrites.send_messages = True
     try:
         await channel.set_permissions(guild.default_role, overwrite=overwrites)
     except Exception as e:
-        print("[stylo] unlock perms failed:", e)
+        log.warning("unlock perms failed: %s", e)
 
 
 # ------------- Scheduler -------------
-@tasks.loop(seconds=10)
-async def scheduler():
-    now = datetime.now(timezone.utc)
-
-    # ENTRY -> VOTING
-    con = db(); cur = con.cursor()
-    cur.execute("SELECT * FROM event WHERE state='entry'")
-    for ev in cur.fetchall():
-        entry_end = datetime.fromisoformat(ev["entry_end_utc"]).astimezone(timezone.utc)
-        if now < entry_end:
-            continue
-
-        guild = bot.get_guild(ev["guild_id"])
-        ch = (
-            guild.get_channel(ev["main_channel_id"])
-            if (guild and ev["main_channel_id"])
-            else (guild.system_channel if guild else None)
-        )
-
-        # collect entrants (only those who actually submitted an image)
-        cur.execute(
-            "SELECT * FROM entrant "
-            "WHERE guild_id=? AND image_url IS NOT NULL AND TRIM(image_url)<>''",
-            (ev["guild_id"],)
-        )
-        entrants = cur.fetchall()
-
-        # no valid images at all
-        if len(entrants) == 0:
-            cur.execute("UPDATE event SET state='closed' WHERE guild_id=?", (ev["guild_id"],))
-            con.commit()
-            if ch:
-                await ch.send(
-                    embed=discord.Embed(
-                        title="✋ Stylo cancelled",
-                        description="Entries closed but there were no valid entries submitted.",
-                        colour=discord.Colour.red()
-                    )
-                )
-            if guild:
-                await cleanup_tickets_for_guild(guild)
-            continue  # go to next event
+async def close_entries(ev, now: datetime, con, cur):
+    """Entries are due to close: pair everyone with an image into round 1 (or cancel / crown early)."""
+    guild = bot.get_guild(ev["guild_id"])
+    ch = (
+        guild.get_channel(ev["main_channel_id"])
+        if (guild and ev["main_channel_id"])
+        else (guild.system_channel if guild else None)
+    )
 
-        # only one valid image → instant champion, NO PAIRS, NO TIE-BREAK
-        if len(entrants) == 1:
-            only = entrants[0]
-            try:
-                cur.execute(
-                    "UPDATE event SET state='closed' WHERE guild_id=?",
-                    (ev["guild_id"],)
-                )
-            finally:
-                con.commit()
+    # collect entrants (only those who actually submitted an image)
+    cur.execute(
+        "SELECT id, user_id, image_url FROM entrant "
+        "WHERE guild_id=? AND image_url IS NOT NULL AND TRIM(image_url)<>''",
+        (ev["guild_id"],)
+    )
+    entrants = cur.fetchall()
 
-            if ch:
-                em = discord.Embed(
-                    title=f"👑 Stylo Champion — {ev['theme']}",
-                    description=f"Only one valid entry was submitted on time.\n\nChampion: <@{only['user_id']}>",
-                    colour=EMBED_COLOUR
+    # no valid images at all
+    if len(entrants) == 0:
+        cur.execute(_SQL_EVENT_CLOSE, (ev["guild_id"],))
+        forget_event(ev["guild_id"])
+        if ch:
+            await ch.send(
+                embed=discord.Embed(
+                    title="✋ Stylo cancelled",
+                    description="Entries closed but there were no valid entries submitted.",
+                    colour=discord.Colour.red()
                 )
-                em.set_image(url=only["image_url"])
-                await ch.send(embed=em)
-
-            if guild:
-                await cleanup_tickets_for_guild(guild)
-            continue  # stop here, don't make any matches
-            
-        if guild and ch:
-            await lock_main_channel(guild, ch)
-
-        # 2 or more valid images → normal pairing flow
-        random.shuffle(entrants)
-        pairs = []
-        for i in range(0, len(entrants), 2):
-            if i + 1 < len(entrants):
-                pairs.append((entrants[i], entrants[i+1]))
-
-        vote_sec = ev["vote_seconds"] if ev["vote_seconds"] else int(ev["vote_hours"]) * 3600
-        vote_end = now + timedelta(seconds=vote_sec)
+            )
+        if guild:
+            await cleanup_tickets_for_guild(guild)
+        return
 
-        # --- PRE-FLAG EVENT TO PREVENT DOUBLE EXEC ---
-        cur.execute("UPDATE event SET state='pre_voting' WHERE guild_id=?", (ev["guild_id"],))
-        con.commit()
+    # only one valid image → instant champion, NO PAIRS, NO TIE-BREAK
+    if len(entrants) == 1:
+        only = entrants[0]
+        try:
+            cur.execute(_SQL_EVENT_CLOSE, (ev["guild_id"],))
+        finally:
+            forget_event(ev["guild_id"])
 
-        # create Round 1 matches
-        for L, R in pairs:
-            cur.execute(
-                "INSERT INTO match(guild_id, round_index, left_id, right_id, end_utc) VALUES(?,?,?,?,?)",
-                (ev["guild_id"], 1, L["id"], R["id"], vote_end.isoformat())
+        if ch:
+            em = discord.Embed(
+                title=f"👑 Stylo Champion — {ev['theme']}",
+                description=f"Only one valid entry was submitted on time.\n\nChampion: <@{only['user_id']}>",
+                colour=EMBED_COLOUR
             )
-        con.commit()
+            em.set_image(url=only["image_url"])
+            await ch.send(embed=em)
 
-        # now officially flip to voting
-        cur.execute(
+        if guild:
+            await cleanup_tickets_for_guild(guild)
+        return  # stop here, don't make any matches
+        
+    if guild and ch:
+        await lock_main_channel(guild, ch)
+
+    # 2 or more valid images → normal pairing flow
+    random.shuffle(entrants)
+    pairs = list(zip(entrants[0::2], entrants[1::2]))  # an odd one out is left unpaired
+
+    vote_sec = event_vote_seconds(ev)
+    vote_end = now + timedelta(seconds=vote_sec)
+
+    # Round 1 matches and the flip to voting land together, so a tick can never
+    # see the event still in 'entry' with its matches already inserted
+    end_iso = vote_end.isoformat()
+    with transaction(con) as tx:
+        tx.executemany(_SQL_MATCH_INSERT, [(ev["guild_id"], 1, L["id"], R["id"], end_iso) for L, R in pairs])
+        tx.execute(
             "UPDATE event SET state='voting', round_index=?, entry_end_utc=? WHERE guild_id=?",
-            (1, vote_end.isoformat(), ev["guild_id"])
+            (1, end_iso, ev["guild_id"])
         )
-        con.commit()
-
-        # ---- DISABLE JOIN BUTTONS NOW ----
-        if ch:
-            if ev["start_msg_id"]:
-                try:
-                    start_msg = await ch.fetch_message(ev["start_msg_id"])
-                    if start_msg and start_msg.embeds:
-                        em = start_msg.embeds[0]
-                        idx_entries = None
-                        for idx, f in enumerate(em.fields):
-                            if f.name.lower().startswith("entries"):
-                                idx_entries = idx
-                                break
-                        if idx_entries is not None:
-                            em.set_field_at(idx_entries, name="Entries", value="**Closed**", inline=True)
-                        else:
-                            em.add_field(name="Entries", value="**Closed**", inline=True)
-                        view = build_join_view(False)
-                        await start_msg.edit(embed=em, view=view)
-                except Exception as ex:
-                    print("[stylo] failed to disable Join on start msg:", ex)
+    forget_event(ev["guild_id"])
 
+    # ---- DISABLE JOIN BUTTONS NOW ----
+    if ch:
+        if ev["start_msg_id"]:
             try:
-                async for msg in ch.history(limit=120):
-                    if not msg.components:
-                        continue
-                    new_view = discord.ui.View()
-                    edited = False
-                    for row in msg.components:
-                        for comp in row.children:
-                            if isinstance(comp, discord.ui.Button) and comp.custom_id == "stylo:join":
-                                b = discord.ui.Button(
-                                    style=comp.style,
-                                    label=comp.label,
-                                    custom_id=comp.custom_id,
-                                    disabled=True
-                                )
-                                new_view.add_item(b)
-                                edited = True
-                    if edited:
-                        try:
-                            await msg.edit(view=new_view)
-                        except Exception:
-                            pass
+                # rebuilt from the event row, so there's no GET just to read the old embed back
+                em = build_start_embed(ev["theme"], "**Closed**", vote_sec)
+                await ch.get_partial_message(ev["start_msg_id"]).edit(embed=em, view=build_join_view(False))
             except Exception as ex:
-                print("[stylo] sweep disable Join failed:", ex)
-        # ---- /DISABLE JOIN BUTTONS ----
-
-        if ch and guild:
-            await ch.send(embed=discord.Embed(
-                title="🆚 Stylo — Round 1 begins!",
-                description=f"All matches posted. Voting closes {rel_ts(vote_end)}.",
-                colour=EMBED_COLOUR
-            ))
-            try:
-                await post_chat_floating_panel(guild, ch, ev)
-            except Exception as e:
-                print("[stylo] chat floating panel (r1) failed:", e)
+                log.warning("failed to disable Join on start msg: %s", ex)
 
-        await post_round_matches(ev, 1, vote_end, con, cur)
-
-    con.close()
-
-    # ------------- VOTING END -> RESULTS/NEXT -------------
-    con = db(); cur = con.cursor()
-    cur.execute("SELECT * FROM event WHERE state='voting'")
-    for ev in cur.fetchall():
-        gid = ev["guild_id"]
-        ridx = ev["round_index"]
+        try:
+            async for msg in ch.history(limit=120):
+                if not msg.components:
+                    continue
+                new_view = discord.ui.View()
+                edited = False
+                for row in msg.components:
+                    for comp in row.children:
+                        if isinstance(comp, discord.ui.Button) and comp.custom_id == "stylo:join":
+                            b = discord.ui.Button(
+                                style=comp.style,
+                                label=comp.label,
+                                custom_id=comp.custom_id,
+                                disabled=True
+                            )
+                            new_view.add_item(b)
+                            edited = True
+                if edited:
+                    try:
+                        await msg.edit(view=new_view)
+                    except Exception:
+                        pass
+        except Exception as ex:
+            log.warning("sweep disable Join failed: %s", ex)
+    # ---- /DISABLE JOIN BUTTONS ----
+
+    if ch and guild:
+        await ch.send(embed=discord.Embed(
+            title="🆚 Stylo — Round 1 begins!",
+            description=f"All matches posted. Voting closes {rel_ts(vote_end)}.",
+            colour=EMBED_COLOUR
+        ))
+        try:
+            await post_chat_floating_panel(guild, ch, ev)
+        except Exception as e:
+            log.warning("chat floating panel (r1) failed: %s", e)
 
-        cur.execute(
-            "SELECT MAX(end_utc) AS mx FROM match WHERE guild_id=? AND round_index=? AND winner_id IS NULL",
-            (gid, ridx)
-        )
-        mx = cur.fetchone()["mx"]
+    await post_round_matches(ev, 1, vote_end, con, cur)
 
-        if not mx:
-            guild = bot.get_guild(gid)
-            ch = guild.get_channel(ev["main_channel_id"]) if (guild and ev["main_channel_id"]) else (guild.system_channel if guild else None)
-            await cleanup_bump_panels(guild, ch)
-            await advance_to_next_round(ev, datetime.now(timezone.utc), con, cur, guild, ch)
-            continue
+async def tick_voting(ev, now: datetime, con, cur):
+    """Settle the round once its last match has closed, then move the bracket on."""
+    gid = ev["guild_id"]
+    ridx = ev["round_index"]
 
-        round_end = datetime.fromisoformat(mx).replace(tzinfo=timezone.utc)
-        if now < round_end:
-            continue
+    cur.execute(_SQL_ROUND_OPEN_MAX_END, (gid, ridx))
+    mx = cur.fetchone()["mx"]
 
+    if not mx:
         guild = bot.get_guild(gid)
         ch = guild.get_channel(ev["main_channel_id"]) if (guild and ev["main_channel_id"]) else (guild.system_channel if guild else None)
+        await cleanup_bump_panels(guild, ch)
+        await advance_to_next_round(ev, datetime.now(timezone.utc), con, cur, guild, ch)
+        return
 
-        cur.execute(
-            "SELECT * FROM match WHERE guild_id=? AND round_index=? AND winner_id IS NULL",
-            (gid, ridx)
-        )
-        ms = cur.fetchall()
-        vote_sec = ev["vote_seconds"] if ev["vote_seconds"] else int(ev["vote_hours"]) * 3600
-
-        any_revote = False
-        for m in ms:
-            L, R = m["left_votes"], m["right_votes"]
-
-            cur.execute("SELECT name,image_url FROM entrant WHERE id=?", (m["left_id"],)); Lrow = cur.fetchone()
-            cur.execute("SELECT name,image_url FROM entrant WHERE id=?", (m["right_id"],)); Rrow = cur.fetchone()
-            Lname = Lrow["name"] if Lrow else "Left"
-            Rname = Rrow["name"] if Rrow else "Right"
-            Lurl = (Lrow["image_url"] or "").strip() if Lrow else ""
-            Rurl = (Rrow["image_url"] or "").strip() if Rrow else ""
-
-            if L == R:
-                any_revote = True
-                new_end = now + timedelta(seconds=vote_sec)
-                cur.execute(
-                    "UPDATE match SET left_votes=0,right_votes=0,end_utc=?,winner_id=NULL WHERE id=?",
-                    (new_end.isoformat(), m["id"])
-                )
-                cur.execute("DELETE FROM voter WHERE match_id=?", (m["id"],))
-                con.commit()
-
-                if ch:
-                    try:
-                        file = None
-                        if Lurl and Rurl:
-                            card = await build_vs_card(Lurl, Rurl)
-                            file = discord.File(card, filename="tie.png")
-
-                        em = discord.Embed(
-                            title=f"🔁 Tie-break — {Lname} vs {Rname}",
-                            description=f"Re-vote open until {rel_ts(new_end)}.",
-                            colour=discord.Colour.orange()
-                        )
-                        view = MatchView(m["id"], new_end, Lname, Rname)
-                        msg = await ch.send(embed=em, view=view, file=file)
-                        view.message = msg
-                    except Exception as e:
-                        print("[stylo] tie announce failed:", e)
-
-                continue
+    round_end = datetime.fromisoformat(mx).replace(tzinfo=timezone.utc)
+    if now < round_end:
+        return
 
-                
-            winner_id = m["left_id"] if L > R else m["right_id"]
-            cur.execute("UPDATE match SET winner_id=?, end_utc=? WHERE id=?", (winner_id, now.isoformat(), m["id"]))
-            con.commit()
+    guild = bot.get_guild(gid)
+    ch = guild.get_channel(ev["main_channel_id"]) if (guild and ev["main_channel_id"]) else (guild.system_channel if guild else None)
 
-            if ch:
-                try:
-                    total = max(1, L + R)
-                    pL = round((L / total) * 100, 1)
-                    pR = round((R / total) * 100, 1)
-                    cur.execute("SELECT user_id,image_url FROM entrant WHERE id=?", (winner_id,))
-                    wrow = cur.fetchone()
-                    winner_mention = f"<@{wrow['user_id']}>" if wrow and wrow["user_id"] else "the winner"
-                    em = discord.Embed(
-                        title=f"🏁 Result — {Lname} vs {Rname}",
-                        description=(f"**{Lname}**: {L} ({pL}%)\n"
-                                     f"**{Rname}**: {R} ({pR}%)\n\n"
-                                     f"🏆 **Winner:** {winner_mention}"),
-                        colour=discord.Colour.green()
-                    )
-                    file = None
-                    wurl = (wrow["image_url"] or "").strip() if wrow else ""
-                    if wurl:
-                        data = await fetch_image_bytes(wurl)
-                        if data:
-                            file = discord.File(io.BytesIO(data), filename=f"winner_{m['id']}.png")
-                            em.set_thumbnail(url=f"attachment://winner_{m['id']}.png")
-                    await ch.send(embed=em, file=file) if file else await ch.send(embed=em)
-                except Exception as e:
-                    print("[stylo] result send error:", e)
+    cur.execute(_SQL_ROUND_OPEN_MATCHES, (gid, ridx))
+    if await settle_round(ev, cur.fetchall(), now, con, ch):
+        return
 
-        if any_revote:
-            cur.execute(
-                "SELECT MAX(end_utc) AS mx FROM match WHERE guild_id=? AND round_index=? AND winner_id IS NULL",
-                (gid, ridx)
-            )
-            mx2 = cur.fetchone()["mx"]
-            if mx2:
-                cur.execute("UPDATE event SET entry_end_utc=?, state='voting' WHERE guild_id=?", (mx2, gid))
-                con.commit()
-            continue
+    await cleanup_bump_panels(guild, ch)
+    await advance_to_next_round(ev, now, con, cur, guild, ch)
 
-        await cleanup_bump_panels(guild, ch)
-        await advance_to_next_round(ev, now, con, cur, guild, ch)
+@tasks.loop(seconds=10)
+async def scheduler():
+    now = datetime.now(timezone.utc)
+    con = db(); cur = con.cursor()
+    # one sweep: entry events already due (UTC ISO strings order lexically), then every voting event
+    cur.execute(_SQL_EVENTS_DUE, (now.isoformat(),))
+    for ev in cur.fetchall():
+        if ev["state"] == "entry":
+            await close_entries(ev, now, con, cur)
+        else:
+            await tick_voting(ev, now, con, cur)
 
-    con.close()
+@scheduler.before_loop
+async def _scheduler_wait_ready():
+    # started from setup_hook, before READY: until then get_guild() is None and a tick
+    # would settle or advance rounds with nowhere to post them
+    await bot.wait_until_ready()
 
 # ------------- Setup & Run -------------
 @bot.event
 async def setup_hook():
+    bot.get_http()
     # persistent Join button
     bot.add_view(build_join_view(True))
-    # sync commands and start scheduler here (fixes NameError on on_ready)
+    # vote buttons on matches still open from before the restart
+    register_open_match_views()
+    # ticket channels, so on_message can skip the DB everywhere else
+    load_ticket_channels()
+    # start scheduler and sync commands here (fixes NameError on on_ready);
+    # the scheduler's first tick waits for READY, not for the sync
+    if not scheduler.is_running():
+        scheduler.start()
     try:
         await bot.tree.sync()
-        for g in bot.guilds:
-            try:
-                await bot.tree.sync(guild=discord.Object(id=g.id))
-            except Exception as e:
-                print("Guild sync err:", g.id, e)
     except Exception as e:
-        print("Slash sync error:", e)
-    if not scheduler.is_running():
-        scheduler.start()
+        log.warning("slash sync failed: %s", e)
 
 @bot.event
 async def on_ready():
-    print(f"Logged in as {bot.user} (ID: {bot.user.id})")
+    log.info("logged in as %s (ID: %s)", bot.user, bot.user.id)
+    await warm_cdn()
 
 if __name__ == "__main__":
     bot.run(TOKEN)